@@ -0,0 +1,78 @@
+"""
+Benchmark de cold start: mede o tempo de import em um interpretador novo e falha
+(exit code 1) se passar do orçamento ou se alguma dependência pesada for carregada
+antes da primeira análise.
+
+Alvos:
+    cli  -> apenas os detectores (o que um script de varredura importa)
+    web  -> main.py (o que cada worker do Flask/gunicorn importa)
+
+Uso:
+    python benchmarks/import_time.py [--runs 5] [--cli-budget 0.15] [--web-budget 0.6]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+TARGETS = {
+    'cli': (
+        'import detectors.url_analyzer, detectors.webpage_analyzer, detectors.db_comparator, '
+        'detectors.technical_evaluator, detectors.content_analyzer'
+    ),
+    'web': 'import main',
+}
+
+# Nenhum destes pode ser importado só por carregar o pacote
+HEAVY = ['requests', 'bs4', 'tldextract', 'whois', 'httpx']
+
+PROBE = (
+    'import sys, time, json\n'
+    't = time.perf_counter()\n'
+    '{stmt}\n'
+    'elapsed = time.perf_counter() - t\n'
+    'print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))\n'
+)
+
+
+def measure(stmt, runs):
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        p = subprocess.run(
+            [sys.executable, '-c', PROBE.format(stmt=stmt, heavy=HEAVY)],
+            cwd=SRC, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(p.stdout.strip().splitlines()[-1])
+        samples.append(result['elapsed'])
+        loaded = result['loaded']
+    samples.sort()
+    return samples[len(samples) // 2], loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--cli-budget', type=float, default=0.15)
+    parser.add_argument('--web-budget', type=float, default=0.6)
+    parser.add_argument('--only', choices=sorted(TARGETS))
+    args = parser.parse_args()
+
+    budgets = {'cli': args.cli_budget, 'web': args.web_budget}
+    failed = False
+    for name, stmt in TARGETS.items():
+        if args.only and name != args.only:
+            continue
+        median, loaded = measure(stmt, args.runs)
+        ok = median <= budgets[name] and not loaded
+        failed = failed or not ok
+        print(f'{name:4} {median * 1000:8.1f} ms (orçamento {budgets[name] * 1000:.0f} ms) '
+              f'{"OK" if ok else "FALHOU"}' + (f' - carregou: {", ".join(loaded)}' if loaded else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
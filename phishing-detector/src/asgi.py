@@ -0,0 +1,388 @@
+"""
+Modo de servidor assíncrono (ASGI).
+
+Cada análise fica "em voo" como uma corrotina enquanto espera rede (páginas, DNS, TLS,
+feeds), então um único processo sustenta milhares de análises simultâneas sem ocupar
+uma thread por requisição. O parsing de HTML (CPU) roda num pool de processos.
+O POST em / e o streaming em /stream são atendidos aqui; todas as demais rotas
+continuam sendo servidas pelo Flask.
+
+Uso:
+    cd src
+    uvicorn asgi:app --host 127.0.0.1 --port 5000
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import ssl
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template
+
+from main import app as flask_app, ResultStream, _verdict, _error_result, _normalize_url, _save_history
+from detectors.url_analyzer import UrlAnalyzer
+from detectors.webpage_analyzer import WebpageAnalyzer, HEADERS
+from detectors.db_comparator import DbComparator
+from detectors.technical_evaluator import TechnicalEvaluator, registered_domain, whois_server, _whois_text
+from detectors.content_analyzer import ContentAnalyzer
+from utils.probes import probe_async, skipped_result, RateLimitExceeded
+from utils.refdata import refresh_lock
+
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))
+WHOIS_WORKERS = int(os.environ.get('WHOIS_WORKERS', 4))
+# Quanto uma análise espera o download do feed do OpenPhish quando ainda não há nenhum
+OPENPHISH_WAIT = 20
+
+_client = None
+_parse_pool = None
+_whois_pool = None
+
+
+def _http():
+    # Um único cliente por processo: reaproveita conexões entre todas as análises
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            verify=False,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=2000, max_keepalive_connections=200),
+        )
+    return _client
+
+
+def _pool():
+    # Criado de dentro do loop, quando o processo já tem threads (pool do WHOIS, executor
+    # padrão, getaddrinfo): fork nesse estado pode deixar o filho preso num lock herdado,
+    # então os workers partem de um forkserver (ou spawn, onde não houver)
+    global _parse_pool
+    if _parse_pool is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _parse_pool
+
+
+def _whois_executor():
+    # Pool próprio e limitado: WHOIS lento não ocupa o executor padrão do loop
+    # (usado por _save_history e pela troca do feed do OpenPhish)
+    global _whois_pool
+    if _whois_pool is None:
+        _whois_pool = ThreadPoolExecutor(max_workers=WHOIS_WORKERS, thread_name_prefix='whois')
+    return _whois_pool
+
+
+def _inspect_page(url, html, redirects):
+    return WebpageAnalyzer().inspect(url, html, redirects)
+
+
+def _inspect_content(url, html):
+    return ContentAnalyzer().inspect(url, html)
+
+
+async def _fetch_page(url):
+    response = await _http().get(url, timeout=6)
+    return response.text, len(response.history)
+
+
+async def _page_results(url):
+    loop = asyncio.get_running_loop()
+    try:
+        html, redirects = await probe_async('page', url, urlparse(url).netloc, _fetch_page, url)
+    except RateLimitExceeded:
+        return skipped_result('Análise da página'), skipped_result('Análise de conteúdo')
+    except httpx.TimeoutException:
+        error = '⚠️ Timeout ao acessar a página (servidor lento/suspeito)'
+        return {'status': 'FAIL', 'details': error}, {'status': 'FAIL', 'details': error}
+    except httpx.ConnectError:
+        error = '⚠️ Não foi possível conectar ao servidor'
+        return {'status': 'FAIL', 'details': error}, {'status': 'FAIL', 'details': error}
+    except Exception as e:
+        return (
+            {'status': 'FAIL', 'details': f'⚠️ Erro ao analisar página: {str(e)[:50]}'},
+            {'status': 'FAIL', 'details': f'⚠️ Erro ao analisar conteúdo: {str(e)[:80]}'},
+        )
+    return await asyncio.gather(
+        loop.run_in_executor(_pool(), _inspect_page, url, html, redirects),
+        loop.run_in_executor(_pool(), _inspect_content, url, html),
+    )
+
+
+async def _resolve(domain):
+    infos = await asyncio.get_running_loop().getaddrinfo(domain, None, family=socket.AF_INET)
+    return infos[0][4][0]
+
+
+async def _peer_cert(domain):
+    context = ssl.create_default_context()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(domain, 443, ssl=context, server_hostname=domain), timeout=5
+    )
+    try:
+        return writer.get_extra_info('peercert')
+    finally:
+        writer.close()
+
+
+async def _whois_lookup(registrable):
+    return await asyncio.get_running_loop().run_in_executor(_whois_executor(), _whois_text, registrable)
+
+
+async def _whois_points(evaluator, domain, skipped):
+    # A espera pelo limite acontece no event loop (probe_async); só a consulta em si vai para a thread
+    try:
+        registrable = registered_domain(domain)
+        if not registrable:
+            return []
+        whois_text = await probe_async('whois', registrable, whois_server(registrable), _whois_lookup, registrable)
+    except RateLimitExceeded:
+        skipped.append('WHOIS')
+        return []
+    except Exception:
+        return []
+    return evaluator.whois_text_points(registrable, whois_text)
+
+
+async def _technical_result(url):
+    evaluator = TechnicalEvaluator()
+    parsed = urlparse(url)
+    domain = parsed.netloc.split(':')[0]
+
+    # WHOIS não tem cliente assíncrono: a consulta roda no pool de threads dedicado
+    skipped = []
+    whois_task = asyncio.ensure_future(_whois_points(evaluator, domain, skipped))
+    cert_task = None
+    if parsed.scheme == 'https':
+        cert_task = asyncio.ensure_future(probe_async('tls', domain, domain, _peer_cert, domain))
+    dns_task = asyncio.ensure_future(probe_async('dns', domain, None, _resolve, domain))
+
+    suspicious_points = list(await whois_task)
+    if cert_task is not None:
+        try:
+            suspicious_points.extend(evaluator.cert_points(domain, await cert_task))
+        except RateLimitExceeded:
+            skipped.append('SSL')
+        except Exception:
+            suspicious_points.append('Erro ao verificar SSL')
+    else:
+        suspicious_points.append('Site não usa HTTPS (conexão insegura)')
+    try:
+        suspicious_points.extend(evaluator.ip_points(await dns_task))
+    except Exception:
+        suspicious_points.append('Domínio não resolvível (DNS)')
+    return evaluator.result(suspicious_points, skipped)
+
+
+async def _download_feed(feed_url):
+    response = await _http().get(feed_url, timeout=5)
+    response.raise_for_status()
+    return response.text
+
+
+async def _openphish_hit(comparator, url):
+    # Retorna (encontrada, consultada), como DbComparator._check_openphish
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + OPENPHISH_WAIT
+    try:
+        # Mesmo arquivo compartilhado do modo síncrono: só um worker baixa o feed por hora
+        while comparator.openphish_due():
+            with refresh_lock(comparator.openphish.path) as acquired:
+                if acquired:
+                    if comparator.openphish_due():
+                        try:
+                            feed_url = 'https://openphish.com/feed.txt'
+                            text = await probe_async('openphish', feed_url, 'openphish.com', _download_feed, feed_url)
+                            await loop.run_in_executor(None, comparator.openphish.replace, DbComparator.parse_feed(text))
+                        except Exception:
+                            comparator.openphish_failed()
+                    break
+            # Outro worker está baixando: com uma versão anterior segue com ela; sem nenhuma
+            # (partida a frio) espera o download, sem bloquear o loop, até OPENPHISH_WAIT
+            if comparator.openphish.available() or loop.time() > deadline:
+                break
+            await asyncio.sleep(0.1)
+        if not comparator.openphish.available():
+            return False, False
+        return DbComparator.feed_matches(url, comparator.openphish), True
+    except Exception:
+        return False, False
+
+
+async def _post_phishtank(url):
+    phishtank_url, data, headers = DbComparator.phishtank_request(url)
+    response = await _http().post(phishtank_url, data=data, headers=headers, timeout=3)
+    if response.status_code != 200:
+        return False
+    return DbComparator.phishtank_matches(response.json())
+
+
+async def _phishtank_hit(url):
+    try:
+        return await probe_async('phishtank', url, 'checkurl.phishtank.com', _post_phishtank, url)
+    except Exception:
+        return False
+
+
+async def _db_result(url):
+    comparator = DbComparator()
+    domain = comparator.domain_of(url)
+    if domain in comparator.local_db:
+        return comparator.verdict(domain)
+    (openphish_hit, openphish_checked), phishtank_hit = await asyncio.gather(
+        _openphish_hit(comparator, url), _phishtank_hit(url)
+    )
+    return comparator.verdict(
+        domain, openphish_hit=openphish_hit, phishtank_hit=phishtank_hit, openphish_checked=openphish_checked
+    )
+
+
+async def _url_result(url):
+    return UrlAnalyzer().analyze(url)
+
+
+def _detector_tasks(url):
+    # Página e conteúdo compartilham o mesmo download; cada um vira uma task própria
+    page = asyncio.ensure_future(_page_results(url))
+
+    async def _webpage():
+        return (await page)[0]
+
+    async def _content():
+        return (await page)[1]
+
+    return {
+        'url_analysis': asyncio.ensure_future(_url_result(url)),
+        'webpage_analysis': asyncio.ensure_future(_webpage()),
+        'db_comparison': asyncio.ensure_future(_db_result(url)),
+        'technical_analysis': asyncio.ensure_future(_technical_result(url)),
+        'content_analysis': asyncio.ensure_future(_content()),
+    }
+
+
+async def analyze_url_async(url):
+    """
+    Mesmo resultado de main.analyze_url(), com as cinco verificações rodando em paralelo.
+    """
+    tasks = _detector_tasks(url)
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return {
+        key: _error_result(result) if isinstance(result, Exception) else result
+        for key, result in zip(tasks, results)
+    }
+
+
+def _task_result(task):
+    # Uma exceção num detector vira FAIL desse detector, sem derrubar o stream inteiro
+    try:
+        return task.result()
+    except Exception as e:
+        return _error_result(e)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _bad_request(send):
+    body = 'Informe a URL a ser analisada'.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': 400,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _index_post(scope, receive, send):
+    form = parse_qs((await _read_body(receive)).decode('utf-8', errors='replace'))
+    raw = (form.get('url') or [''])[0]
+    if not raw.strip():
+        return await _bad_request(send)
+    url = _normalize_url(raw)
+    results = await analyze_url_async(url)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _save_history, url, results)
+    except Exception:
+        pass
+    with flask_app.test_request_context('/', method='POST'):
+        html = render_template('index.html', results=results, verdict=_verdict(results)).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/html; charset=utf-8'), (b'content-length', str(len(html)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': html})
+
+
+async def _stream(scope, receive, send):
+    query = parse_qs(scope.get('query_string', b'').decode('utf-8', errors='replace'))
+    raw = (query.get('url') or [''])[0]
+    if not raw.strip():
+        return await _bad_request(send)
+    url = _normalize_url(raw)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache')],
+    })
+    events = ResultStream()
+    tasks = _detector_tasks(url)
+    keys = {task: key for key, task in tasks.items()}
+    pending = set(tasks.values())
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            chunk = events.result(keys[task], _task_result(task)).encode('utf-8')
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': events.verdict().encode('utf-8')})
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _save_history, url, events.results)
+    except Exception:
+        pass
+
+
+async def _lifespan(receive, send):
+    global _client, _parse_pool, _whois_pool
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _client is not None:
+                await _client.aclose()
+                _client = None
+            if _parse_pool is not None:
+                _parse_pool.shutdown(wait=False)
+                _parse_pool = None
+            if _whois_pool is not None:
+                _whois_pool.shutdown(wait=False)
+                _whois_pool = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+_wsgi = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/' and scope['method'] == 'POST':
+        return await _index_post(scope, receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/stream':
+        return await _stream(scope, receive, send)
+    return await _wsgi(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host='127.0.0.1', port=5000)
@@ -1,19 +1,35 @@
-import requests
-from bs4 import BeautifulSoup
 import re
+from urllib.parse import urlparse
+from utils.probes import probe, skipped_result, RateLimitExceeded
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
 
 
 class ContentAnalyzer:
     def analyze(self, url):
+        # requests é carregado sob demanda para não pesar no import do pacote
+        import requests
+        try:
+            # Mesma chave do WebpageAnalyzer: a busca da página é compartilhada entre os detectores
+            response = probe('page', url, urlparse(url).netloc, requests.get, url, timeout=6, headers=HEADERS, verify=False)
+            return self.inspect(url, response.text)
+        except RateLimitExceeded:
+            return skipped_result('Análise de conteúdo')
+        except Exception as e:
+            return {'status': 'FAIL', 'details': f'⚠️ Erro ao analisar conteúdo: {str(e)[:80]}'}
+
+    def inspect(self, url, html):
+        """
+        Aplica as heurísticas de conteúdo sobre o HTML já baixado (sem acesso à rede).
+        """
+        from bs4 import BeautifulSoup
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, timeout=6, headers=headers, verify=False)
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(html, 'html.parser')
 
             suspicious_points = []
             
             text_content = soup.get_text().strip()
-            html_size = len(response.text)
+            html_size = len(html)
             
             # Detecta páginas suspeitas que parecem vazias (carregamento via JS)
             if html_size < 3000 and len(text_content) < 100:
@@ -45,7 +61,6 @@ class ContentAnalyzer:
                 fake_verification_keywords = ['robot', 'captcha', 'verification', 'verify', 'human', 'ロボット', '認証', 'verificação']
                 if any(kw in title_text for kw in fake_verification_keywords):
                     # Se tem título de verificação MAS não é de domínios legítimos (google.com/recaptcha)
-                    from urllib.parse import urlparse
                     parsed = urlparse(url)
                     if 'google.com' not in parsed.netloc and 'recaptcha' not in parsed.netloc:
                         suspicious_points.append('Título sugere verificação/CAPTCHA suspeito (possível phishing)')
@@ -53,7 +68,6 @@ class ContentAnalyzer:
             # Verifica logos de marcas conhecidas (possível clonagem)
             images = soup.find_all('img')
             brand_logos = ['paypal', 'apple', 'microsoft', 'google', 'amazon', 'facebook', 'instagram', 'netflix', 'itau', 'bradesco', 'santander', 'nubank']
-            from urllib.parse import urlparse
             parsed = urlparse(url)
             domain_lower = parsed.netloc.lower()
             logo_flag = False
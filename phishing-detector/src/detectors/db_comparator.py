@@ -1,110 +1,186 @@
 import os
 import csv
-import requests
-import json
+import time
+import zlib
+from functools import lru_cache
 from urllib.parse import urlparse
+from utils.probes import probe
+from utils.refdata import shared_table, refresh_lock, SharedTable
+
+DATABASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+FAMOUS_BRANDS = ['google', 'facebook', 'amazon', 'paypal', 'apple', 'microsoft', 'netflix', 'instagram', 'itau', 'nubank', 'bradesco', 'santander', 'allegro', 'ebay', 'aliexpress', 'mercadolivre', 'americanas']
+
+# O feed do OpenPhish é atualizado a cada hora
+OPENPHISH_MAX_AGE = 3600
+
+# Depois de uma falha ao baixar o feed, este processo espera antes de tentar de novo
+OPENPHISH_RETRY = 60
+_openphish_retry_at = 0
+
+
+def _file_source(path):
+    # Tamanho e mtime_ns do arquivo: muda mesmo quando o CSV chega com mtime antigo
+    # (git checkout, cp -p, rsync -t), ao contrário de comparar só as datas
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _compiled_table(name, source, load):
+    """
+    Tabela de referência compilada em src/database/<name>.sst e mapeada em memória,
+    compartilhada por todos os workers. source() identifica a versão atual dos dados
+    (None se a fonte não existe) e fica gravada no cabeçalho: a tabela é recompilada
+    quando difere. Só um processo reconstrói; os outros esperam esse build terminar e
+    remapeiam após a troca do arquivo.
+    Se a tabela não puder ser gravada ou mapeada (ex: diretório somente leitura),
+    os dados são carregados em memória como antes.
+    """
+    table = shared_table(os.path.join(DATABASE_DIR, name + '.sst'))
+    try:
+        wanted = source()
+        if wanted is not None and table.source() != wanted:
+            with refresh_lock(table.path, blocking=True):
+                wanted = source()
+                if wanted is not None and table.source() != wanted:
+                    table.replace(load(), wanted)
+        if table.available():
+            return table
+    except Exception:
+        pass
+    try:
+        return set(load())
+    except Exception:
+        return set()
+
+
+@lru_cache(maxsize=None)
+def _brands_table():
+    # A lista de marcas só muda com o código: confere/recompila uma vez por processo
+    return _compiled_table(
+        'brands',
+        lambda: (len(FAMOUS_BRANDS), zlib.crc32('\n'.join(FAMOUS_BRANDS).encode('utf-8'))),
+        lambda: FAMOUS_BRANDS,
+    )
+
+
+def _read_local_db(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [row[0].strip().lower() for row in csv.reader(f) if row]
+
 
 class DbComparator:
     def __init__(self):
-        # Tenta carregar uma base local em src/database/phishing_db.csv
-        self.local_db = set()
-        base = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'database'))
-        csv_path = os.path.join(base, 'phishing_db.csv')
-        if os.path.exists(csv_path):
-            try:
-                with open(csv_path, newline='', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        if row:
-                            self.local_db.add(row[0].strip().lower())
-            except Exception:
-                self.local_db = set()
-        
-        # Cache do OpenPhish (evita múltiplas requisições)
-        self.openphish_cache = None
-        self.openphish_cache_time = 0
+        # Base local em src/database/phishing_db.csv, recompilada quando o CSV muda
+        csv_path = os.path.join(DATABASE_DIR, 'phishing_db.csv')
+        self.local_db = _compiled_table(
+            'phishing_db',
+            lambda: _file_source(csv_path),
+            lambda: _read_local_db(csv_path),
+        )
+        self.brands = _brands_table()
+        # Feed do OpenPhish compartilhado: baixado por um único worker a cada hora
+        self.openphish = shared_table(os.path.join(DATABASE_DIR, 'openphish.sst'))
+
+    def openphish_stale(self):
+        age = self.openphish.age()
+        return age is None or age > OPENPHISH_MAX_AGE
+
+    def openphish_due(self):
+        # Feed ausente ou vencido, e sem falha recente de download neste processo
+        return self.openphish_stale() and time.monotonic() >= _openphish_retry_at
+
+    @staticmethod
+    def openphish_failed():
+        global _openphish_retry_at
+        _openphish_retry_at = time.monotonic() + OPENPHISH_RETRY
     
     def _check_openphish(self, url):
         """
         Consulta o feed público do OpenPhish para verificar se a URL está reportada.
         OpenPhish Feed: https://openphish.com/feed.txt (atualizado a cada hora)
+        Retorna (encontrada, consultada): sem feed disponível a URL não foi verificada.
         """
-        import time
-        
+        # requests é carregado sob demanda para não pesar no import do pacote
+        import requests
+
         try:
-            # Cache por 1 hora (3600 segundos)
-            current_time = time.time()
-            if self.openphish_cache is None or (current_time - self.openphish_cache_time) > 3600:
-                # Baixa o feed do OpenPhish
-                response = requests.get('https://openphish.com/feed.txt', timeout=5)
-                if response.status_code == 200:
-                    # Converte para conjunto de URLs normalizadas
-                    urls = [line.strip().lower() for line in response.text.strip().split('\n') if line.strip()]
-                    self.openphish_cache = set(urls)
-                    self.openphish_cache_time = current_time
-                else:
-                    return False, None
-            
-            # Verifica se a URL está no feed
-            url_normalized = url.lower().strip()
-            
-            # Verifica URL exata
-            if url_normalized in self.openphish_cache:
-                return True, 'OpenPhish'
-            
-            # Verifica URL sem protocolo (http:// ou https://)
-            parsed = urlparse(url_normalized)
-            url_without_protocol = parsed.netloc + parsed.path
-            if parsed.path:
-                url_without_protocol = url_without_protocol.rstrip('/')
-            
-            for cached_url in self.openphish_cache:
-                if url_without_protocol in cached_url or cached_url in url_without_protocol:
-                    return True, 'OpenPhish'
-            
-            return False, None
-            
+            if self.openphish_due():
+                # Sem feed nenhum (partida a frio) espera o worker que está baixando em vez
+                # de comparar com uma tabela vazia; com uma versão anterior, segue com ela
+                with refresh_lock(self.openphish.path, blocking=not self.openphish.available()) as acquired:
+                    if acquired and self.openphish_due():
+                        try:
+                            feed_url = 'https://openphish.com/feed.txt'
+                            response = probe('openphish', feed_url, 'openphish.com', requests.get, feed_url, timeout=5)
+                            response.raise_for_status()
+                            self.openphish.replace(self.parse_feed(response.text))
+                        except Exception:
+                            self.openphish_failed()
+
+            if not self.openphish.available():
+                return False, False
+            return self.feed_matches(url, self.openphish), True
+
         except Exception:
-            return False, None
+            return False, False
+
+    @staticmethod
+    def parse_feed(text):
+        # Converte para conjunto de URLs normalizadas
+        return set(line.strip().lower() for line in text.strip().split('\n') if line.strip())
+
+    @staticmethod
+    def feed_matches(url, feed):
+        # Verifica se a URL está no feed
+        url_normalized = url.lower().strip()
+        
+        # Verifica URL exata (busca binária quando o feed é a tabela mapeada)
+        if url_normalized in feed:
+            return True
+        
+        # Verifica URL sem protocolo (http:// ou https://)
+        parsed = urlparse(url_normalized)
+        url_without_protocol = parsed.netloc + parsed.path
+        if parsed.path:
+            url_without_protocol = url_without_protocol.rstrip('/')
+        
+        if isinstance(feed, SharedTable):
+            # Compara os bytes do mmap direto, sem decodificar cada entrada
+            return feed.overlaps(url_without_protocol)
+        for cached_url in feed:
+            if url_without_protocol in cached_url or cached_url in url_without_protocol:
+                return True
+        return False
     
     def _check_phishtank(self, url):
         """
         Consulta a API do PhishTank para verificar se a URL está reportada como phishing.
         PhishTank API: https://www.phishtank.com/api_info.php
         """
+        import requests
+
         try:
-            # PhishTank requer registro para obter API key
-            # Por padrão, tenta usar variável de ambiente PHISHTANK_API_KEY
-            api_key = os.environ.get('PHISHTANK_API_KEY', '')
-            
-            # Endpoint público do PhishTank (checkurl)
-            phishtank_url = 'https://checkurl.phishtank.com/checkurl/'
-            
-            data = {
-                'url': url,
-                'format': 'json'
-            }
-            
-            if api_key:
-                data['app_key'] = api_key
-            
-            headers = {
-                'User-Agent': 'phishing-detector/1.0'
-            }
-            
-            response = requests.post(
+            phishtank_url, data, headers = self.phishtank_request(url)
+
+            # Consultas simultâneas da mesma URL compartilham uma única requisição,
+            # respeitando o limite de taxa do PhishTank
+            response = probe(
+                'phishtank',
+                url,
+                'checkurl.phishtank.com',
+                requests.post,
                 phishtank_url,
                 data=data,
                 headers=headers,
                 timeout=3
             )
             
-            if response.status_code == 200:
-                result = response.json()
-                # PhishTank retorna: {"results": {"in_database": true/false, "valid": true/false}}
-                if result.get('results', {}).get('in_database', False):
-                    if result['results'].get('valid', False):
-                        return True, 'PhishTank'
+            if response.status_code == 200 and self.phishtank_matches(response.json()):
+                return True, 'PhishTank'
             
             return False, None
             
@@ -112,6 +188,35 @@ class DbComparator:
             # Se falhar a consulta (sem API key, timeout, etc), continua com verificação local
             return False, None
 
+    @staticmethod
+    def phishtank_request(url):
+        # PhishTank requer registro para obter API key
+        # Por padrão, tenta usar variável de ambiente PHISHTANK_API_KEY
+        api_key = os.environ.get('PHISHTANK_API_KEY', '')
+        
+        # Endpoint público do PhishTank (checkurl)
+        phishtank_url = 'https://checkurl.phishtank.com/checkurl/'
+        
+        data = {
+            'url': url,
+            'format': 'json'
+        }
+        
+        if api_key:
+            data['app_key'] = api_key
+        
+        headers = {
+            'User-Agent': 'phishing-detector/1.0'
+        }
+        return phishtank_url, data, headers
+
+    @staticmethod
+    def phishtank_matches(result):
+        # PhishTank retorna: {"results": {"in_database": true/false, "valid": true/false}}
+        if result.get('results', {}).get('in_database', False):
+            return bool(result['results'].get('valid', False))
+        return False
+
     def _levenshtein(self, a: str, b: str) -> int:
         # Implementação simples e eficiente da distância de Levenshtein
         if a == b:
@@ -134,31 +239,45 @@ class DbComparator:
 
     def _is_similar_to_brand(self, domain: str):
         # Checa similaridade por Levenshtein contra marcas conhecidas
-        famous_brands = ['google', 'facebook', 'amazon', 'paypal', 'apple', 'microsoft', 'netflix', 'instagram', 'itau', 'nubank', 'bradesco', 'santander', 'allegro', 'ebay', 'aliexpress', 'mercadolivre', 'americanas']
         d = domain.lower()
-        for brand in famous_brands:
+        for brand in self.brands:
             # calcula distância e compara razão com o tamanho do brand
             dist = self._levenshtein(d, brand)
             if dist <= 2 and abs(len(d) - len(brand)) <= 3:
                 return True, brand
         return False, ''
 
+    def domain_of(self, url):
+        return urlparse(url).netloc.lower().replace('www.', '')
+
     def compare(self, url):
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower().replace('www.', '')
+        domain = self.domain_of(url)
 
         # 1. Verifica base local (CSV externo, sem hardcode)
         if domain in self.local_db:
-            return {'status': 'FAIL', 'details': '⚠️ Domínio presente na base local de phishing'}
+            return self.verdict(domain)
 
         # 2. Consulta OpenPhish (feed público, sem API key necessária)
-        is_phishing_op, source_op = self._check_openphish(url)
+        is_phishing_op, openphish_checked = self._check_openphish(url)
         if is_phishing_op:
-            return {'status': 'FAIL', 'details': '⚠️ PHISHING CONFIRMADO: URL reportada no OpenPhish'}
+            return self.verdict(domain, openphish_hit=True)
 
         # 3. Consulta PhishTank API em tempo real (requer API key para funcionar sem bloqueios)
         is_phishing_pt, source_pt = self._check_phishtank(url)
-        if is_phishing_pt:
+        return self.verdict(domain, phishtank_hit=is_phishing_pt, openphish_checked=openphish_checked)
+
+    def verdict(self, domain, openphish_hit=False, phishtank_hit=False, openphish_checked=True):
+        """
+        Monta o resultado a partir dos sinais já coletados, na ordem de prioridade:
+        base local, OpenPhish, PhishTank e por fim typosquatting.
+        """
+        if domain in self.local_db:
+            return {'status': 'FAIL', 'details': '⚠️ Domínio presente na base local de phishing'}
+
+        if openphish_hit:
+            return {'status': 'FAIL', 'details': '⚠️ PHISHING CONFIRMADO: URL reportada no OpenPhish'}
+
+        if phishtank_hit:
             return {'status': 'FAIL', 'details': '⚠️ PHISHING CONFIRMADO: URL reportada no PhishTank'}
 
         # 4. Verifica similaridade com marcas conhecidas (Levenshtein)
@@ -166,4 +285,6 @@ class DbComparator:
         if similar:
             return {'status': 'FAIL', 'details': f'⚠️ Domínio similar a marca conhecida ({brand}) - possível typosquatting'}
 
+        if not openphish_checked:
+            return {'status': 'OK', 'details': '✓ Verificado: PhishTank + Base local + Typosquatting (feed do OpenPhish indisponível, não consultado)'}
         return {'status': 'OK', 'details': '✓ Verificado: OpenPhish + PhishTank + Base local + Typosquatting'}
@@ -4,113 +4,165 @@ import ipaddress
 from datetime import datetime
 from urllib.parse import urlparse
 import subprocess
-try:
-    import whois as pywhois
-except Exception:
-    pywhois = None
-import tldextract
 import re
+from functools import lru_cache
+from utils.probes import probe, RateLimitExceeded
+
+
+@lru_cache(maxsize=None)
+def _tld_extractor():
+    # Carregado sob demanda e uma única vez por processo. suffix_list_urls=() faz o
+    # tldextract usar apenas o snapshot da public suffix list que acompanha o pacote,
+    # sem tentar atualizar a lista pela rede (evita travar em containers offline).
+    import tldextract
+    return tldextract.TLDExtract(suffix_list_urls=())
+
+
+def registered_domain(domain):
+    return _tld_extractor()(domain).registered_domain
+
+
+def whois_server(registrable):
+    # <tld>.whois-servers.net aponta para o servidor WHOIS do TLD: é o destino real da consulta
+    return registrable.rsplit('.', 1)[-1] + '.whois-servers.net'
+
+
+def _whois_text(registrable):
+    try:
+        import whois as pywhois
+    except Exception:
+        pywhois = None
+    if pywhois:
+        w = pywhois.whois(registrable)
+        return str(w)
+    p = subprocess.run(['whois', registrable], capture_output=True, text=True, timeout=6)
+    return p.stdout.lower()
+
+
+def _peer_cert(domain):
+    context = ssl.create_default_context()
+    with socket.create_connection((domain, 443), timeout=5) as sock:
+        with context.wrap_socket(sock, server_hostname=domain) as ssock:
+            return ssock.getpeercert()
 
 
 class TechnicalEvaluator:
     def evaluate(self, url):
         parsed = urlparse(url)
         domain = parsed.netloc.split(':')[0]
-        suspicious_points = []
+        skipped = []
+        suspicious_points = self.whois_points(domain, skipped)
+
+        # Verifica certificado SSL
+        if parsed.scheme == 'https':
+            try:
+                cert = probe('tls', domain, domain, _peer_cert, domain)
+                suspicious_points.extend(self.cert_points(domain, cert))
+            except RateLimitExceeded:
+                skipped.append('SSL')
+            except Exception:
+                suspicious_points.append('Erro ao verificar SSL')
+        else:
+            suspicious_points.append('Site não usa HTTPS (conexão insegura)')
+
+        # DNS (consulta vai para o resolver, não para o alvo: só agrupa, sem limite de taxa)
+        try:
+            ip_address = probe('dns', domain, None, socket.gethostbyname, domain)
+            suspicious_points.extend(self.ip_points(ip_address))
+        except Exception:
+            suspicious_points.append('Domínio não resolvível (DNS)')
+
+        return self.result(suspicious_points, skipped)
 
+    def whois_points(self, domain, skipped=None):
         # WHOIS / idade do domínio (subprocess fallback)
         try:
-            ext = tldextract.extract(domain)
-            registrable = ext.registered_domain
+            registrable = registered_domain(domain)
             if registrable:
-                whois_text = ''
                 try:
-                    if pywhois:
-                        w = pywhois.whois(registrable)
-                        whois_text = str(w)
-                    else:
-                        p = subprocess.run(['whois', registrable], capture_output=True, text=True, timeout=6)
-                        whois_text = p.stdout.lower()
-                    # Tenta reconhecer várias datas comuns
-                    m = re.search(r'creation date:\s*([0-9T:\- ]{8,25})', whois_text)
-                    if not m:
-                        m = re.search(r'created on:\s*([0-9T:\- ]{8,25})', whois_text)
-                    if not m:
-                        m = re.search(r'domain created:\s*([0-9T:\- ]{8,25})', whois_text)
-                    if m:
-                        date_raw = m.group(1).strip()
-                        # tenta vários formatos
-                        for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d-%b-%Y', '%Y.%m.%d', '%d.%m.%Y'):
-                            try:
-                                creation = datetime.strptime(date_raw.split('T')[0], fmt)
-                                age_days = (datetime.now() - creation).days
-                                if age_days < 365:
-                                    suspicious_points.append(f'Domínio jovem ({age_days} dias)')
-                                break
-                            except Exception:
-                                continue
-                    # Verifica nomes comuns de DNS dinâmico no registrable
-                    dyn_providers = ['no-ip', 'dyndns', 'duckdns', 'freedns', 'ddns']
-                    if any(p in (registrable or '').lower() for p in dyn_providers):
-                        suspicious_points.append('Usa provedor de DNS dinâmico (ex: no-ip/dyndns)')
+                    # Consultas WHOIS simultâneas ao mesmo domínio são agrupadas e limitadas
+                    whois_text = probe('whois', registrable, whois_server(registrable), _whois_text, registrable)
+                    return self.whois_text_points(registrable, whois_text)
+                except RateLimitExceeded:
+                    if skipped is not None:
+                        skipped.append('WHOIS')
                 except Exception:
                     pass
         except Exception:
             pass
+        return []
 
-        # Verifica certificado SSL
-        if parsed.scheme == 'https':
+    def whois_text_points(self, registrable, whois_text):
+        suspicious_points = []
+        # Tenta reconhecer várias datas comuns
+        m = re.search(r'creation date:\s*([0-9T:\- ]{8,25})', whois_text)
+        if not m:
+            m = re.search(r'created on:\s*([0-9T:\- ]{8,25})', whois_text)
+        if not m:
+            m = re.search(r'domain created:\s*([0-9T:\- ]{8,25})', whois_text)
+        if m:
+            date_raw = m.group(1).strip()
+            # tenta vários formatos
+            for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d-%b-%Y', '%Y.%m.%d', '%d.%m.%Y'):
+                try:
+                    creation = datetime.strptime(date_raw.split('T')[0], fmt)
+                    age_days = (datetime.now() - creation).days
+                    if age_days < 365:
+                        suspicious_points.append(f'Domínio jovem ({age_days} dias)')
+                    break
+                except Exception:
+                    continue
+        # Verifica nomes comuns de DNS dinâmico no registrable
+        dyn_providers = ['no-ip', 'dyndns', 'duckdns', 'freedns', 'ddns']
+        if any(p in (registrable or '').lower() for p in dyn_providers):
+            suspicious_points.append('Usa provedor de DNS dinâmico (ex: no-ip/dyndns)')
+        return suspicious_points
+
+    def cert_points(self, domain, cert):
+        suspicious_points = []
+        not_after_str = cert.get('notAfter')
+        if not_after_str:
             try:
-                context = ssl.create_default_context()
-                with socket.create_connection((domain, 443), timeout=5) as sock:
-                    with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                        cert = ssock.getpeercert()
-                        not_after_str = cert.get('notAfter')
-                        if not_after_str:
-                            try:
-                                not_after = datetime.strptime(not_after_str, '%b %d %H:%M:%S %Y %Z')
-                                days_until_expiry = (not_after - datetime.now()).days
-                                if days_until_expiry < 30:
-                                    suspicious_points.append(f'Certificado expira em breve ({days_until_expiry} dias)')
-                            except Exception:
-                                pass
-
-                        subject = cert.get('subject', ())
-                        try:
-                            subject_dict = dict(x[0] for x in subject)
-                            issued_to = subject_dict.get('commonName', '')
-                        except Exception:
-                            issued_to = ''
-                        if issued_to and (issued_to not in domain and not issued_to.startswith('*.')):
-                            suspicious_points.append('Certificado não corresponde ao domínio')
-                        # issuer
-                        issuer = cert.get('issuer', ())
-                        try:
-                            issuer_dict = dict(x[0] for x in issuer)
-                            issued_by = issuer_dict.get('organizationName', issuer_dict.get('commonName', ''))
-                            if issued_by and 'let\'s encrypt' in str(issued_by).lower():
-                                # Let's Encrypt é comum, não é automaticamente suspeito
-                                pass
-                        except Exception:
-                            issued_by = ''
+                not_after = datetime.strptime(not_after_str, '%b %d %H:%M:%S %Y %Z')
+                days_until_expiry = (not_after - datetime.now()).days
+                if days_until_expiry < 30:
+                    suspicious_points.append(f'Certificado expira em breve ({days_until_expiry} dias)')
             except Exception:
-                suspicious_points.append('Erro ao verificar SSL')
-        else:
-            suspicious_points.append('Site não usa HTTPS (conexão insegura)')
+                pass
 
-        # DNS
+        subject = cert.get('subject', ())
         try:
-            ip_address = socket.gethostbyname(domain)
-            try:
-                ip_obj = ipaddress.ip_address(ip_address)
-                if ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local:
-                    suspicious_points.append(f'IP privado ou localhost ({ip_address})')
-            except Exception:
-                # se não conseguiu interpretar o IP, não marca como privado
+            subject_dict = dict(x[0] for x in subject)
+            issued_to = subject_dict.get('commonName', '')
+        except Exception:
+            issued_to = ''
+        if issued_to and (issued_to not in domain and not issued_to.startswith('*.')):
+            suspicious_points.append('Certificado não corresponde ao domínio')
+        # issuer
+        issuer = cert.get('issuer', ())
+        try:
+            issuer_dict = dict(x[0] for x in issuer)
+            issued_by = issuer_dict.get('organizationName', issuer_dict.get('commonName', ''))
+            if issued_by and 'let\'s encrypt' in str(issued_by).lower():
+                # Let's Encrypt é comum, não é automaticamente suspeito
                 pass
         except Exception:
-            suspicious_points.append('Domínio não resolvível (DNS)')
+            issued_by = ''
+        return suspicious_points
+
+    def ip_points(self, ip_address):
+        try:
+            ip_obj = ipaddress.ip_address(ip_address)
+            if ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local:
+                return [f'IP privado ou localhost ({ip_address})']
+        except Exception:
+            # se não conseguiu interpretar o IP, não marca como privado
+            pass
+        return []
 
+    def result(self, suspicious_points, skipped=()):
         if suspicious_points:
             return {'status': 'FAIL', 'details': f'⚠️ {len(suspicious_points)} problema(s): {"; ".join(suspicious_points[:3])}'}
+        if skipped:
+            return {'status': 'SKIPPED', 'details': f'⏸ Verificações adiadas pelo limite de requisições: {", ".join(skipped)} (inconclusivo)'}
         return {'status': 'OK', 'details': '✓ Verificações técnicas OK'}
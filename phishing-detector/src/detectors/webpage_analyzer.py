@@ -1,29 +1,51 @@
-import requests
-from bs4 import BeautifulSoup
 import re
+from urllib.parse import urlparse
+from utils.probes import probe, skipped_result, RateLimitExceeded
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
 
 class WebpageAnalyzer:
     def analyze(self, url):
+        # requests é carregado sob demanda para não pesar no import do pacote
+        import requests
         try:
-            from urllib.parse import urlparse
-            parsed_url = urlparse(url)
-            
             # Tenta acessar a página
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, timeout=5, headers=headers, verify=False)
+            # Requisições idênticas em andamento compartilham a mesma resposta (limitado por host)
+            response = probe('page', url, urlparse(url).netloc, requests.get, url, timeout=5, headers=HEADERS, verify=False)
+            return self.inspect(url, response.text, len(response.history))
+        except RateLimitExceeded:
+            return skipped_result('Análise da página')
+        except requests.exceptions.Timeout:
+            return {'status': 'FAIL', 'details': '⚠️ Timeout ao acessar a página (servidor lento/suspeito)'}
+        except requests.exceptions.SSLError:
+            return {'status': 'FAIL', 'details': '⚠️ Erro de certificado SSL (conexão insegura)'}
+        except requests.exceptions.ConnectionError:
+            return {'status': 'FAIL', 'details': '⚠️ Não foi possível conectar ao servidor'}
+        except Exception as e:
+            return {'status': 'FAIL', 'details': f'⚠️ Erro ao analisar página: {str(e)[:50]}'}
+
+    def inspect(self, url, html, redirects):
+        """
+        Aplica as heurísticas sobre o HTML já baixado (sem acesso à rede).
+        Separado de analyze() para que o modo assíncrono possa rodar o parsing num executor.
+        """
+        from bs4 import BeautifulSoup
+        try:
+            parsed_url = urlparse(url)
             
             suspicious_points = []
             
             # Verifica redirecionamentos suspeitos
-            if len(response.history) > 2:
-                suspicious_points.append(f'Múltiplos redirecionamentos ({len(response.history)})')
+            if redirects > 2:
+                suspicious_points.append(f'Múltiplos redirecionamentos ({redirects})')
             
             # Analisa o conteúdo HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(html, 'html.parser')
             
             # Detecta páginas vazias/minimalistas que carregam conteúdo via JS (técnica de phishing)
             text_content = soup.get_text().strip()
-            html_size = len(response.text)
+            html_size = len(html)
             links = soup.find_all('a', href=True)
             
             # Se página é muito pequena E quase sem texto visível E sem links = suspeito
@@ -114,11 +136,5 @@ class WebpageAnalyzer:
             
             return {'status': 'OK', 'details': '✓ Conteúdo da página parece legítimo'}
             
-        except requests.exceptions.Timeout:
-            return {'status': 'FAIL', 'details': '⚠️ Timeout ao acessar a página (servidor lento/suspeito)'}
-        except requests.exceptions.SSLError:
-            return {'status': 'FAIL', 'details': '⚠️ Erro de certificado SSL (conexão insegura)'}
-        except requests.exceptions.ConnectionError:
-            return {'status': 'FAIL', 'details': '⚠️ Não foi possível conectar ao servidor'}
         except Exception as e:
             return {'status': 'FAIL', 'details': f'⚠️ Erro ao analisar página: {str(e)[:50]}'}
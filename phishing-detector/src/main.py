@@ -1,12 +1,20 @@
-from flask import Flask, request, render_template, send_file
+from flask import Flask, Response, abort, request, render_template, send_file, stream_with_context
 from detectors.url_analyzer import UrlAnalyzer
 from detectors.webpage_analyzer import WebpageAnalyzer
 from detectors.db_comparator import DbComparator
 from detectors.technical_evaluator import TechnicalEvaluator
 from detectors.content_analyzer import ContentAnalyzer
+from utils.rollups import StatsRollups, HISTORY_COLUMNS, STATUS_COUNTERS
+from utils.refdata import refresh_lock
 import os
 import csv
+import click
 import io
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 # Define os caminhos corretos para templates e static
@@ -19,38 +27,153 @@ app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        url = request.form['url'].strip()
-        # normaliza esquema caso usuário não inclua — assume HTTPS por padrão
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        url = _url_param(request.form.get('url'))
         results = analyze_url(url)
         try:
             _save_history(url, results)
         except Exception:
             pass
-        all_ok = all(r['status'] == 'OK' for r in results.values())
-        return render_template('index.html', results=results, all_ok=all_ok)
-    return render_template('index.html', results=None, all_ok=None)
+        return render_template('index.html', results=results, verdict=_verdict(results))
+    return render_template('index.html', results=None, verdict=None)
+
+# Textos do veredito final, usados na página renderizada e no streaming (JS)
+VERDICTS = {
+    'safe': {
+        'title': 'URL Segura',
+        'message': 'Nenhuma ameaça detectada. Esta URL parece segura para acesso.',
+        'icon': 'fa-check-circle',
+    },
+    'inconclusive': {
+        'title': 'Análise Inconclusiva',
+        'message': 'Algumas verificações foram adiadas pelo limite de requisições. Tente novamente em instantes antes de acessar esta URL.',
+        'icon': 'fa-question-circle',
+    },
+    'danger': {
+        'title': 'URL Suspeita',
+        'message': 'Atenção! Esta URL apresenta características suspeitas. Evite acessá-la.',
+        'icon': 'fa-exclamation-triangle',
+    },
+}
+
+@app.context_processor
+def _verdict_texts():
+    return {'verdicts': VERDICTS}
+
+def _verdict(results):
+    # Qualquer FAIL é suspeito; SKIPPED (verificação adiada pelo nosso limite de taxa)
+    # não prova que a URL é segura, então o resultado fica inconclusivo
+    statuses = [r['status'] for r in results.values()]
+    if 'FAIL' in statuses:
+        return 'danger'
+    if 'SKIPPED' in statuses:
+        return 'inconclusive'
+    return 'safe'
+
+def _url_param(value):
+    # URL vazia ou ausente vira 400, em vez de uma análise de 'https://'
+    if not (value or '').strip():
+        abort(400, 'Informe a URL a ser analisada')
+    return _normalize_url(value)
+
+def _normalize_url(url):
+    url = url.strip()
+    # normaliza esquema caso usuário não inclua — assume HTTPS por padrão
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+# Detectores por chave de resultado, na ordem em que aparecem na página
+DETECTORS = {
+    'url_analysis': lambda url: UrlAnalyzer().analyze(url),
+    'webpage_analysis': lambda url: WebpageAnalyzer().analyze(url),
+    'db_comparison': lambda url: DbComparator().compare(url),
+    'technical_analysis': lambda url: TechnicalEvaluator().evaluate(url),
+    'content_analysis': lambda url: ContentAnalyzer().analyze(url),
+}
+
+# Tempo até o primeiro resultado (ms) das últimas análises em streaming
+_ttfr_samples = deque(maxlen=1000)
+
+
+class ResultStream:
+    """
+    Formata os resultados como eventos SSE na ordem em que os detectores terminam:
+    um evento 'result' por detector e, por último, o 'verdict'. Também mede o tempo
+    até o primeiro resultado.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ttfr_ms = None
+        self.results = {}
+
+    def _event(self, event, data):
+        return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+    def result(self, key, result):
+        if self.ttfr_ms is None:
+            self.ttfr_ms = (time.perf_counter() - self.started) * 1000
+            _ttfr_samples.append(self.ttfr_ms)
+        self.results[key] = result
+        return self._event('result', {'key': key, 'status': result['status'], 'details': result['details']})
+
+    def verdict(self):
+        return self._event('verdict', {
+            'verdict': _verdict(self.results),
+            'ttfr_ms': round(self.ttfr_ms or 0, 1),
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+        })
+
+
+def _error_result(e):
+    return {'status': 'FAIL', 'details': f'⚠️ Erro na verificação: {str(e)[:80]}'}
+
+
+def _iter_results(url):
+    # Roda os detectores em paralelo e entrega cada resultado assim que fica pronto
+    with ThreadPoolExecutor(max_workers=len(DETECTORS)) as pool:
+        futures = {pool.submit(fn, url): key for key, fn in DETECTORS.items()}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = _error_result(e)
+            yield futures[future], result
+
 
 def analyze_url(url):
-    url_analyzer = UrlAnalyzer()
-    webpage_analyzer = WebpageAnalyzer()
-    db_comparator = DbComparator()
-    technical_evaluator = TechnicalEvaluator()
-    content_analyzer = ContentAnalyzer()
-
-    url_analysis = url_analyzer.analyze(url)
-    webpage_analysis = webpage_analyzer.analyze(url)
-    db_comparison = db_comparator.compare(url)
-    technical_analysis = technical_evaluator.evaluate(url)
-    content_analysis = content_analyzer.analyze(url)
+    # Mesmos detectores do streaming, em paralelo; o resultado segue a ordem de DETECTORS
+    results = dict(_iter_results(url))
+    return {key: results[key] for key in DETECTORS}
 
+
+@app.route('/stream')
+def stream():
+    url = _url_param(request.args.get('url'))
+
+    def generate():
+        events = ResultStream()
+        for key, result in _iter_results(url):
+            yield events.result(key, result)
+        yield events.verdict()
+        try:
+            _save_history(url, events.results)
+        except Exception:
+            pass
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/metrics')
+def metrics():
+    samples = sorted(_ttfr_samples)
+    if not samples:
+        return {'stream_scans': 0, 'ttfr_ms_p50': None, 'ttfr_ms_p95': None}
     return {
-        'url_analysis': url_analysis,
-        'webpage_analysis': webpage_analysis,
-        'db_comparison': db_comparison,
-        'technical_analysis': technical_analysis,
-        'content_analysis': content_analysis
+        'stream_scans': len(samples),
+        'ttfr_ms_p50': round(samples[len(samples) // 2], 1),
+        'ttfr_ms_p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
     }
 
 def _ensure_history():
@@ -60,22 +183,48 @@ def _ensure_history():
     if not os.path.exists(hist):
         with open(hist, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(['timestamp','url','url_status','webpage_status','db_status','technical_status','content_status'])
+            writer.writerow(HISTORY_COLUMNS)
     return hist
 
+_rollups = None
+_rollups_lock = threading.Lock()
+
+def _get_rollups():
+    # Agregados do /stats; na primeira vez são reconstruídos a partir do histórico existente
+    # O lock garante um único backfill (DELETE + reconstrução) por processo, e o
+    # refresh_lock um único entre workers, antes de qualquer record() concorrente
+    global _rollups
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                hist = _ensure_history()
+                rollups = StatsRollups(os.path.join(os.path.dirname(hist), 'rollups.sqlite3'))
+                with refresh_lock(rollups.path, blocking=True):
+                    if not rollups.backfilled():
+                        rollups.backfill(hist)
+                _rollups = rollups
+    return _rollups
+
 def _save_history(url, results):
     hist = _ensure_history()
-    with open(hist, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.utcnow().isoformat(),
-            url,
-            results['url_analysis']['status'],
-            results['webpage_analysis']['status'],
-            results['db_comparison']['status'],
-            results['technical_analysis']['status'],
-            results['content_analysis']['status']
-        ])
+    # Inicializa os agregados antes de escrever a linha, senão o backfill inicial a contaria duas vezes
+    rollups = _get_rollups()
+    timestamp = datetime.utcnow()
+    statuses = {
+        'url_status': results['url_analysis']['status'],
+        'webpage_status': results['webpage_analysis']['status'],
+        'db_status': results['db_comparison']['status'],
+        'technical_status': results['technical_analysis']['status'],
+        'content_status': results['content_analysis']['status']
+    }
+    # Linha do histórico e agregados sob o mesmo lock do backfill: um backfill-stats
+    # concorrente não pode ler a linha nova e depois vê-la contada de novo pelo record()
+    with refresh_lock(rollups.path, blocking=True):
+        with open(hist, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([timestamp.isoformat(), url] + [statuses[col] for col in STATUS_COUNTERS])
+        # Atualiza os agregados no momento da escrita para o /stats não precisar reler o histórico
+        rollups.record(timestamp, url, statuses)
 
 
 @app.route('/history')
@@ -94,30 +243,28 @@ def export_history():
 
 @app.route('/stats')
 def stats():
-    hist = _ensure_history()
-    counts = {
-        'total': 0,
-        'url_fail': 0,
-        'webpage_fail': 0,
-        'db_fail': 0,
-        'technical_fail': 0,
-        'content_fail': 0
-    }
-    with open(hist, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            counts['total'] += 1
-            if row.get('url') == 'FAIL' or row.get('url_status') == 'FAIL':
-                counts['url_fail'] += 1
-            if row.get('webpage_status') == 'FAIL':
-                counts['webpage_fail'] += 1
-            if row.get('db_status') == 'FAIL':
-                counts['db_fail'] += 1
-            if row.get('technical_status') == 'FAIL':
-                counts['technical_fail'] += 1
-            if row.get('content_status') == 'FAIL':
-                counts['content_fail'] += 1
-    return counts
+    """
+    Contagens de análises e de FAIL por detector, lidas dos agregados pré-computados.
+    ?window=15m|24h|7d... limita a um período; ?group_by=host|tld quebra por grupo.
+    """
+    window = request.args.get('window')
+    group_by = request.args.get('group_by')
+    try:
+        if group_by:
+            groups = _get_rollups().query(window, group_by, limit=request.args.get('limit', 50, type=int))
+            return {'window': window or 'all', 'group_by': group_by, 'groups': groups}
+        return _get_rollups().query(window)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+
+@app.cli.command('backfill-stats')
+def backfill_stats():
+    """Reconstrói os agregados do /stats a partir do history.csv."""
+    rollups = _get_rollups()
+    with refresh_lock(rollups.path, blocking=True):
+        count = rollups.backfill(_ensure_history())
+    click.echo(f'{count} análises processadas')
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
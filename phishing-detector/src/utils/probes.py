@@ -0,0 +1,187 @@
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+def skipped_result(what):
+    # Resultado inconclusivo: a verificação não rodou por causa do nosso próprio limite de taxa
+    return {'status': 'SKIPPED', 'details': f'⏸ {what} adiada: limite de requisições atingido (inconclusivo)'}
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas concorrentes idênticas: enquanto uma sonda com a mesma chave
+    estiver em andamento, as demais threads esperam e recebem o mesmo resultado
+    (ou a mesma exceção). Nada é guardado depois que a chamada termina.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['event'].set()
+
+
+class AsyncSingleFlight:
+    """
+    Equivalente ao SingleFlight para corrotinas: chamadas concorrentes com a mesma
+    chave aguardam a mesma task em vez de repetir a sonda.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        import asyncio
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # shield: o cancelamento de um cliente não derruba a sonda dos demais
+        return await asyncio.shield(task)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        # rate: tokens por segundo; capacity: tamanho máximo da rajada
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # Retorna 0 se conseguiu um token, senão quantos segundos esperar pelo próximo
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        # Mesma lógica de acquire(), mas sem bloquear o event loop enquanto espera
+        import asyncio
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Um token bucket por (tipo de sonda, destino), criado sob demanda, para que página,
+    TLS etc. de um mesmo host não disputem a mesma rajada.
+    Serviços de terceiros (PhishTank, WHOIS) têm limites mais baixos que o padrão; o
+    limite é procurado pelo destino e, se não houver, pelo tipo de sonda.
+
+    Os buckets ficam na memória do processo: com N workers (gunicorn/uvicorn), cada
+    destino recebe até N vezes a taxa configurada. Ajuste PROBE_LIMITS dividindo pelo
+    número de workers se o limite do serviço for estrito.
+    """
+
+    def __init__(self, default=(5, 10), overrides=None, timeout=10):
+        self.default = default
+        self.overrides = dict(overrides or {})
+        self.timeout = timeout
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, kind, host):
+        with self._lock:
+            bucket = self._buckets.get((kind, host))
+            if bucket is None:
+                rate, capacity = self.overrides.get(host, self.overrides.get(kind, self.default))
+                bucket = TokenBucket(rate, capacity)
+                self._buckets[(kind, host)] = bucket
+            return bucket
+
+    def acquire(self, kind, host):
+        if not self._bucket(kind, host).acquire(self.timeout):
+            raise RateLimitExceeded(f'Limite de requisições atingido para {host}')
+
+    async def acquire_async(self, kind, host):
+        if not await self._bucket(kind, host).acquire_async(self.timeout):
+            raise RateLimitExceeded(f'Limite de requisições atingido para {host}')
+
+
+# Limites por destino, ou por tipo de sonda: (requisições por segundo, rajada máxima).
+# O de 'whois' vale para cada servidor WHOIS (um por TLD), não para todos juntos.
+PROBE_LIMITS = {
+    'checkurl.phishtank.com': (0.5, 5),
+    'openphish.com': (0.2, 2),
+    'whois': (1, 5),
+}
+
+_inflight = SingleFlight()
+_inflight_async = AsyncSingleFlight()
+host_limiter = HostRateLimiter(overrides=PROBE_LIMITS)
+
+
+def probe(kind, key, host, fn, *args, **kwargs):
+    """
+    Executa uma sonda de rede uma única vez por (kind, key) em andamento.
+    Apenas a chamada líder consome token do limite do host; as demais compartilham o resultado.
+    host=None agrupa sem limitar (ex: DNS, que vai para o resolver e não para o alvo).
+    Se o limite estourar, levanta RateLimitExceeded: a verificação fica inconclusiva,
+    não é sinal de phishing.
+    """
+    def _limited():
+        if host is not None:
+            host_limiter.acquire(kind, host)
+        return fn(*args, **kwargs)
+    return _inflight.do((kind, key), _limited)
+
+
+async def probe_async(kind, key, host, coro_fn, *args, **kwargs):
+    """
+    Versão assíncrona de probe(): os buckets de limite são os mesmos do modo síncrono.
+    """
+    async def _limited():
+        if host is not None:
+            await host_limiter.acquire_async(kind, host)
+        return await coro_fn(*args, **kwargs)
+    return await _inflight_async.do((kind, key), _limited)
@@ -0,0 +1,243 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Formato: cabeçalho (magic, quantidade, identidade da fonte), tabela de offsets
+# uint32 (n + 1) e as strings UTF-8 ordenadas concatenadas. A busca é binária direto
+# sobre o mmap. A identidade da fonte (dois inteiros, ex: tamanho e mtime_ns do CSV)
+# diz de qual versão dos dados a tabela foi compilada.
+MAGIC = b'PDSST2\n\0'
+_HEADER = struct.Struct('<8sIqq')
+_SPAN = struct.Struct('<II')
+
+
+def write_table(path, strings, source=(0, 0)):
+    """
+    Grava a tabela num arquivo temporário no mesmo diretório e troca de forma atômica
+    (os.replace). Quem já tem o arquivo antigo mapeado continua lendo a versão anterior.
+    """
+    items = sorted(set(s.encode('utf-8') for s in strings if s))
+    offsets = [0]
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'.{name}.')
+    try:
+        # mkstemp cria com 0600 e o os.replace mantém: workers de outro usuário não conseguiriam mapear
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(items), *source))
+            f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+            f.write(b''.join(items))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class SortedStringTable:
+    """
+    Conjunto imutável de strings lido de um arquivo mapeado em memória (somente leitura).
+    Todos os processos que mapeiam o mesmo arquivo compartilham as mesmas páginas.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            st = os.fstat(f.fileno())
+        self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f'Arquivo de referência inválido: {path}')
+        magic, self._count, *source = _HEADER.unpack_from(self._mm, 0)
+        self.source = tuple(source)
+        if magic != MAGIC:
+            raise ValueError(f'Arquivo de referência inválido: {path}')
+        self._data = _HEADER.size + 4 * (self._count + 1)
+
+    def __len__(self):
+        return self._count
+
+    def _span(self, i):
+        return _SPAN.unpack_from(self._mm, _HEADER.size + 4 * i)
+
+    def _item(self, i):
+        start, end = self._span(i)
+        return self._mm[self._data + start:self._data + end]
+
+    def _index_at(self, offset):
+        # Índice da entrada que contém a posição offset do bloco de strings
+        lo, hi = 0, self._count - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._span(mid)[0] <= offset:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def __contains__(self, key):
+        key = key.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._item(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._count and self._item(lo) == key
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._item(i).decode('utf-8')
+
+    def overlaps(self, text):
+        """
+        True se alguma entrada contém text ou está contida nele. Compara os bytes do
+        mmap direto, sem decodificar as entradas.
+        """
+        key = text.encode('utf-8')
+        if not key:
+            return self._count > 0
+        # Entrada que contém text: busca no bloco inteiro e descarta ocorrências que
+        # atravessam a fronteira entre duas entradas
+        pos = self._mm.find(key, self._data)
+        while pos != -1:
+            offset = pos - self._data
+            if offset + len(key) <= self._span(self._index_at(offset))[1]:
+                return True
+            pos = self._mm.find(key, pos + 1)
+        # Entrada contida em text: só as que cabem nele
+        for i in range(self._count):
+            start, end = self._span(i)
+            if end - start <= len(key) and self._mm[self._data + start:self._data + end] in key:
+                return True
+        return False
+
+
+class SharedTable:
+    """
+    Referência para uma SortedStringTable que se remapeia sozinha quando o arquivo é
+    trocado por outro processo. Se o arquivo ainda não existe, comporta-se como vazia.
+    """
+
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._table = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        if self._table is not None and time.monotonic() - self._checked < self.check_interval:
+            return self._table
+        with self._lock:
+            if self._table is not None and time.monotonic() - self._checked < self.check_interval:
+                return self._table
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                # Arquivo ausente não é guardado: a próxima chamada verifica de novo
+                return self._table
+            identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if self._table is None or self._table.identity != identity:
+                try:
+                    # A tabela antiga é liberada quando ninguém mais a estiver usando
+                    self._table = SortedStringTable(self.path)
+                except ValueError:
+                    # Formato antigo ou arquivo corrompido: tratado como ausente até ser recompilado
+                    return self._table
+            self._checked = time.monotonic()
+            return self._table
+
+    def available(self):
+        return self._current() is not None
+
+    def age(self):
+        """Segundos desde a última gravação, ou None se a tabela ainda não existe."""
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def source(self):
+        """
+        Identidade da fonte gravada no arquivo atual, ou None se ele não existe ou está
+        num formato antigo. Lê o cabeçalho do disco, sem esperar o intervalo de remapeamento.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                magic, _, *source = _HEADER.unpack(f.read(_HEADER.size))
+        except (OSError, struct.error):
+            return None
+        return tuple(source) if magic == MAGIC else None
+
+    def replace(self, strings, source=(0, 0)):
+        write_table(self.path, strings, source)
+        self._checked = 0
+
+    def __len__(self):
+        table = self._current()
+        return len(table) if table is not None else 0
+
+    def __contains__(self, key):
+        table = self._current()
+        return table is not None and key in table
+
+    def __iter__(self):
+        table = self._current()
+        return iter(table) if table is not None else iter(())
+
+    def overlaps(self, text):
+        table = self._current()
+        return table is not None and table.overlaps(text)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_table(path):
+    # Uma única instância por arquivo em cada processo
+    with _shared_lock:
+        table = _shared.get(path)
+        if table is None:
+            table = SharedTable(path)
+            _shared[path] = table
+        return table
+
+
+@contextmanager
+def refresh_lock(path, blocking=False):
+    """
+    Lock entre processos para que só um worker reconstrua a tabela. No modo não
+    bloqueante os demais recebem False e seguem usando a versão atual; no bloqueante
+    esperam o build em andamento terminar. Sem fcntl (Windows) sempre retorna True.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path + '.lock', 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,217 @@
+import csv
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+# Colunas de status do histórico -> contador de FAIL correspondente
+STATUS_COUNTERS = {
+    'url_status': 'url_fail',
+    'webpage_status': 'webpage_fail',
+    'db_status': 'db_fail',
+    'technical_status': 'technical_fail',
+    'content_status': 'content_fail',
+}
+
+COUNTERS = ['total'] + list(STATUS_COUNTERS.values())
+
+HISTORY_COLUMNS = ['timestamp', 'url'] + list(STATUS_COUNTERS)
+
+# Formato do início de cada bucket; 'all' é um único bucket acumulado
+GRANULARITIES = {
+    'minute': '%Y-%m-%dT%H:%M',
+    'hour': '%Y-%m-%dT%H',
+    'day': '%Y-%m-%d',
+}
+
+# Quanto tempo manter cada granularidade (buckets de dia nunca expiram)
+RETENTION = {
+    'minute': timedelta(days=3),
+    'hour': timedelta(days=90),
+}
+
+GROUPS = ('all', 'host', 'tld')
+
+# Maior janela aceita no /stats (o histórico em buckets de dia não expira)
+MAX_WINDOW = timedelta(days=3650)
+
+_UNITS = {'m': timedelta(minutes=1), 'h': timedelta(hours=1), 'd': timedelta(days=1)}
+
+_WINDOW_RE = re.compile(r'^(\d+)([mhd])$')
+
+
+def parse_window(window):
+    """
+    Converte '15m', '24h', '7d'... em (timedelta, granularidade). A granularidade é a
+    mais grossa que ainda representa bem a janela, então a consulta lê no máximo
+    algumas dezenas de buckets independente do tamanho do histórico.
+    """
+    m = _WINDOW_RE.match(window or '')
+    if not m or int(m.group(1)) == 0:
+        raise ValueError(f'Janela inválida: {window!r} (use por exemplo 15m, 24h ou 7d)')
+    amount, unit = int(m.group(1)), _UNITS[m.group(2)]
+    # Compara antes de multiplicar: valores enormes estourariam o timedelta
+    if amount > MAX_WINDOW // unit:
+        raise ValueError(f'Janela muito longa: {window!r} (máximo {MAX_WINDOW.days}d)')
+    delta = amount * unit
+    if delta <= timedelta(hours=2):
+        return delta, 'minute'
+    if delta <= timedelta(days=3):
+        return delta, 'hour'
+    return delta, 'day'
+
+
+def host_and_tld(url):
+    host = (urlparse(url).hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host:
+        return '', ''
+    if re.match(r'^[\d.]+$', host) or ':' in host:
+        return host, 'ip'
+    return host, host.rsplit('.', 1)[-1]
+
+
+class StatsRollups:
+    """
+    Agregados pré-computados do histórico (total e FAIL por detector), por minuto,
+    hora, dia e acumulado, quebrados por host e por TLD. Ficam num SQLite ao lado do
+    history.csv para que vários workers possam incrementar os mesmos contadores.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last_prune = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rollups ('
+            ' granularity TEXT NOT NULL, bucket TEXT NOT NULL, group_by TEXT NOT NULL, group_key TEXT NOT NULL, '
+            + ', '.join(f'{c} INTEGER NOT NULL DEFAULT 0' for c in COUNTERS) +
+            ', PRIMARY KEY (granularity, bucket, group_by, group_key))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS rollups_window ON rollups (granularity, group_by, bucket)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        return conn
+
+    def backfilled(self):
+        """
+        True se um backfill já foi concluído. O marcador é gravado na mesma transação
+        da reconstrução, então um backfill interrompido não conta.
+        """
+        if not os.path.exists(self.path):
+            return False
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone() is not None
+        finally:
+            conn.close()
+
+    def _rows(self, timestamp, url, statuses):
+        # Uma linha de incremento por (granularidade, bucket, agrupamento)
+        host, tld = host_and_tld(url)
+        keys = {'all': '', 'host': host, 'tld': tld}
+        increments = [1] + [1 if statuses.get(col) == 'FAIL' else 0 for col in STATUS_COUNTERS]
+        buckets = [(g, timestamp.strftime(fmt)) for g, fmt in GRANULARITIES.items()] + [('all', '')]
+        for granularity, bucket in buckets:
+            for group_by in GROUPS:
+                yield [granularity, bucket, group_by, keys[group_by]] + increments
+
+    def _upsert(self, conn, rows):
+        conn.executemany(
+            'INSERT INTO rollups (granularity, bucket, group_by, group_key, ' + ', '.join(COUNTERS) + ') '
+            'VALUES (?, ?, ?, ?, ' + ', '.join('?' for _ in COUNTERS) + ') '
+            'ON CONFLICT (granularity, bucket, group_by, group_key) DO UPDATE SET '
+            + ', '.join(f'{c} = {c} + excluded.{c}' for c in COUNTERS),
+            rows,
+        )
+
+    def record(self, timestamp, url, statuses):
+        """
+        Incrementa os agregados de uma análise. statuses usa as mesmas chaves das
+        colunas do histórico (url_status, webpage_status, ...).
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                self._upsert(conn, list(self._rows(timestamp, url, statuses)))
+                self._prune(conn, timestamp)
+        finally:
+            conn.close()
+
+    def _prune(self, conn, now):
+        # No máximo uma limpeza por minuto por processo
+        if time.time() - self._last_prune < 60:
+            return
+        self._last_prune = time.time()
+        self._delete_expired(conn, now)
+
+    def _delete_expired(self, conn, now):
+        for granularity, keep in RETENTION.items():
+            cutoff = (now - keep).strftime(GRANULARITIES[granularity])
+            conn.execute('DELETE FROM rollups WHERE granularity = ? AND bucket < ?', (granularity, cutoff))
+
+    def backfill(self, history_path):
+        """
+        Reconstrói todos os agregados a partir do history.csv. Retorna quantas linhas foram lidas.
+        """
+        count = 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM rollups')
+                with open(history_path, newline='', encoding='utf-8') as f:
+                    # Lê por posição: arquivos antigos de histórico podem não ter cabeçalho
+                    for values in csv.reader(f):
+                        if not values or values[0] == 'timestamp':
+                            continue
+                        row = dict(zip(HISTORY_COLUMNS, values))
+                        try:
+                            timestamp = datetime.fromisoformat(row['timestamp'])
+                        except Exception:
+                            continue
+                        self._upsert(conn, list(self._rows(timestamp, row.get('url', ''), row)))
+                        count += 1
+                self._delete_expired(conn, datetime.utcnow())
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', ?)",
+                    (datetime.utcnow().isoformat(),),
+                )
+        finally:
+            conn.close()
+        return count
+
+    def query(self, window=None, group_by=None, limit=50, now=None):
+        """
+        Soma os buckets da janela. Sem janela usa o acumulado; com group_by retorna
+        os grupos (host ou tld) com mais análises.
+        """
+        if group_by is not None and group_by not in ('host', 'tld'):
+            raise ValueError(f'group_by inválido: {group_by!r} (use host ou tld)')
+        if window is None:
+            granularity, since = 'all', ''
+        else:
+            delta, granularity = parse_window(window)
+            since = ((now or datetime.utcnow()) - delta).strftime(GRANULARITIES[granularity])
+
+        sums = ', '.join(f'COALESCE(SUM({c}), 0)' for c in COUNTERS)
+        conn = self._connect()
+        try:
+            if group_by is None:
+                row = conn.execute(
+                    f'SELECT {sums} FROM rollups WHERE granularity = ? AND bucket >= ? AND group_by = ?',
+                    (granularity, since, 'all'),
+                ).fetchone()
+                return dict(zip(COUNTERS, row))
+            rows = conn.execute(
+                f'SELECT group_key, {sums} FROM rollups WHERE granularity = ? AND bucket >= ? AND group_by = ? '
+                'GROUP BY group_key ORDER BY 2 DESC LIMIT ?',
+                (granularity, since, group_by, limit),
+            ).fetchall()
+            return {row[0]: dict(zip(COUNTERS, row[1:])) for row in rows}
+        finally:
+            conn.close()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos do projeto são importados a partir de src (detectors.*, utils.*), como no servidor
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import probes
+from utils.probes import (
+    AsyncSingleFlight,
+    HostRateLimiter,
+    RateLimitExceeded,
+    SingleFlight,
+    TokenBucket,
+    skipped_result,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(probes.time, 'monotonic', fake)
+    return fake
+
+
+def _run_concurrently(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    results = []
+    barrier = threading.Barrier(10)
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'resultado'
+
+    def worker():
+        barrier.wait()
+        results.append(flight.do('k', fn))
+
+    _run_concurrently(10, worker)
+    assert len(calls) == 1
+    assert results == ['resultado'] * 10
+
+
+def test_single_flight_shares_the_error_and_keeps_nothing():
+    flight = SingleFlight()
+    calls = []
+    errors = []
+    barrier = threading.Barrier(5)
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError('falhou')
+
+    def worker():
+        barrier.wait()
+        try:
+            flight.do('k', fn)
+        except ValueError as e:
+            errors.append(e)
+
+    _run_concurrently(5, worker)
+    assert len(calls) == 1
+    assert len(errors) == 5 and all(e is errors[0] for e in errors)
+    # Depois que a chamada termina, a próxima roda de novo
+    assert flight.do('k', lambda: 'nova') == 'nova'
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+
+
+def test_async_single_flight_coalesces():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    async def main():
+        return await asyncio.gather(*[flight.do('k', fn) for _ in range(20)])
+
+    assert asyncio.run(main()) == ['ok'] * 20
+    assert len(calls) == 1
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.acquire(timeout=0) for _ in range(3)] == [True] * 3
+    assert bucket.acquire(timeout=0) is False
+    clock.now += 0.5
+    assert bucket.acquire(timeout=0) is True
+    assert bucket.acquire(timeout=0) is False
+    # Nunca acumula além da capacidade
+    clock.now += 60
+    assert [bucket.acquire(timeout=0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_waits_within_timeout():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.acquire(timeout=0)
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - started >= 0.03
+
+
+def test_token_bucket_acquire_async(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+
+    async def main():
+        return [await bucket.acquire_async(timeout=0) for _ in range(2)]
+
+    assert asyncio.run(main()) == [True, False]
+
+
+def test_host_rate_limiter_buckets_and_overrides():
+    limiter = HostRateLimiter(
+        default=(5, 2), overrides={'api.example': (1, 1), 'whois': (1, 3)}, timeout=0
+    )
+    # Limite padrão, separado por tipo de sonda e por destino
+    limiter.acquire('page', 'a.example')
+    limiter.acquire('page', 'a.example')
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire('page', 'a.example')
+    limiter.acquire('tls', 'a.example')
+    limiter.acquire('page', 'b.example')
+
+    # Override pelo destino
+    limiter.acquire('phishtank', 'api.example')
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire('phishtank', 'api.example')
+
+    # Override pelo tipo vale para cada destino separadamente
+    for _ in range(3):
+        limiter.acquire('whois', 'com.whois-servers.net')
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire('whois', 'com.whois-servers.net')
+    limiter.acquire('whois', 'br.whois-servers.net')
+
+
+def test_probe_limits_only_the_leader(monkeypatch):
+    limiter = HostRateLimiter(default=(0.01, 1), timeout=0)
+    monkeypatch.setattr(probes, 'host_limiter', limiter)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def fn():
+        time.sleep(0.2)
+        return 'pagina'
+
+    def worker():
+        barrier.wait()
+        results.append(probes.probe('page', 'https://a.example/', 'a.example', fn))
+
+    _run_concurrently(8, worker)
+    assert results == ['pagina'] * 8
+    # O único token foi consumido pela chamada líder
+    with pytest.raises(RateLimitExceeded):
+        probes.probe('page', 'https://a.example/', 'a.example', fn)
+
+
+def test_probe_without_host_is_not_limited(monkeypatch):
+    monkeypatch.setattr(probes, 'host_limiter', HostRateLimiter(default=(1, 1), timeout=0))
+    assert [probes.probe('dns', 'a.example', None, lambda: '1.2.3.4') for _ in range(5)] == ['1.2.3.4'] * 5
+
+
+def test_probe_async_raises_when_limited(monkeypatch):
+    monkeypatch.setattr(probes, 'host_limiter', HostRateLimiter(default=(0.01, 1), timeout=0))
+
+    async def fetch():
+        return 'ok'
+
+    async def main():
+        first = await probes.probe_async('page', 'u1', 'a.example', fetch)
+        with pytest.raises(RateLimitExceeded):
+            await probes.probe_async('page', 'u2', 'a.example', fetch)
+        return first
+
+    assert asyncio.run(main()) == 'ok'
+
+
+def test_skipped_result_is_inconclusive():
+    result = skipped_result('Análise da página')
+    assert result['status'] == 'SKIPPED'
+    assert 'Análise da página' in result['details']
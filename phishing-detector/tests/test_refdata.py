@@ -0,0 +1,148 @@
+import os
+import random
+import stat
+import struct
+
+import pytest
+
+from detectors.db_comparator import DbComparator
+from utils import refdata
+from utils.refdata import SharedTable, SortedStringTable, refresh_lock, shared_table, write_table
+
+
+def _table(tmp_path, strings, name='t.sst', source=(0, 0)):
+    path = str(tmp_path / name)
+    write_table(path, strings, source)
+    return SortedStringTable(path)
+
+
+def _old_loop(text, entries):
+    # Laço original de feed_matches, sobre strings já decodificadas
+    return any(text in entry or entry in text for entry in entries)
+
+
+def test_round_trip(tmp_path):
+    strings = ['paypal.com', 'ação.com.br', 'a', 'zz/login', 'paypal.com', '', 'm' * 300]
+    table = _table(tmp_path, strings)
+    expected = sorted(set(s for s in strings if s), key=lambda s: s.encode('utf-8'))
+    assert len(table) == len(expected)
+    assert list(table) == expected
+    for s in expected:
+        assert s in table
+    for s in ['', 'paypal', 'paypal.co', 'ação.com', 'zz/login/', 'b']:
+        assert s not in table
+
+
+def test_empty_table(tmp_path):
+    table = _table(tmp_path, [])
+    assert len(table) == 0
+    assert list(table) == []
+    assert 'a' not in table
+    assert not table.overlaps('a')
+    assert not table.overlaps('')
+
+
+def test_overlaps_does_not_cross_entry_boundaries(tmp_path):
+    table = _table(tmp_path, ['ab', 'cd'])
+    # No bloco de dados as entradas ficam coladas ('abcd'), mas 'bc' não é de nenhuma delas
+    assert not table.overlaps('bc')
+    assert table.overlaps('b')
+    assert table.overlaps('xcdx')
+    assert not table.overlaps('ac')
+
+
+def test_overlaps_matches_the_old_loop(tmp_path):
+    rng = random.Random(7)
+    words = ['paypal', 'login', 'secure', 'ação', 'bank', 'x', 'verify', '.com', '/']
+    entries = {''.join(rng.choices(words, k=rng.randint(1, 5))) for _ in range(400)}
+    table = _table(tmp_path, entries)
+    samples = sorted(entries)
+    for _ in range(3000):
+        entry = rng.choice(samples)
+        text = rng.choice([
+            entry,
+            entry[1:-1],
+            entry + '/extra',
+            'pre' + entry,
+            rng.choice(words) + rng.choice(words),
+            entry[: len(entry) // 2] + entry[-1:],
+            ''.join(rng.choices('abcdeçã./', k=rng.randint(1, 8))),
+        ])
+        assert table.overlaps(text) == _old_loop(text, entries), text
+
+
+def test_source_identity_round_trip(tmp_path):
+    table = _table(tmp_path, ['a'], source=(123, 1763519778000000000))
+    assert table.source == (123, 1763519778000000000)
+    path = str(tmp_path / 't.sst')
+    assert SharedTable(path).source() == (123, 1763519778000000000)
+    SharedTable(path).replace(['b'], (124, -5))
+    assert SharedTable(path).source() == (124, -5)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fchmod'), reason='permissões POSIX')
+def test_tables_are_world_readable(tmp_path):
+    _table(tmp_path, ['a'])
+    assert stat.S_IMODE(os.stat(tmp_path / 't.sst').st_mode) == 0o644
+
+
+def test_missing_and_old_format_tables_are_unavailable(tmp_path):
+    path = str(tmp_path / 'feed.sst')
+    table = SharedTable(path)
+    assert not table.available()
+    assert table.source() is None
+    assert len(table) == 0 and 'a' not in table and not table.overlaps('a')
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<8sI', b'PDSST1\n\0', 0) + struct.pack('<I', 0))
+    assert not table.available()
+    assert table.source() is None
+
+    table.replace(['a'])
+    assert table.available() and 'a' in table
+
+
+def test_shared_table_remaps_after_replace_by_another_instance(tmp_path):
+    path = str(tmp_path / 'feed.sst')
+    reader = SharedTable(path, check_interval=0)
+    writer = SharedTable(path)
+    writer.replace(['https://a.example/'])
+    assert 'https://a.example/' in reader
+    writer.replace(['https://b.example/'])
+    assert 'https://b.example/' in reader
+    assert 'https://a.example/' not in reader
+
+
+def test_shared_table_registry_is_per_path(tmp_path):
+    a = shared_table(str(tmp_path / 'a.sst'))
+    assert shared_table(str(tmp_path / 'a.sst')) is a
+    assert shared_table(str(tmp_path / 'b.sst')) is not a
+
+
+@pytest.mark.skipif(refdata.fcntl is None, reason='requer fcntl')
+def test_refresh_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / 'feed.sst')
+    with refresh_lock(path) as first:
+        assert first
+        with refresh_lock(path) as second:
+            assert not second
+    with refresh_lock(path) as again:
+        assert again
+
+
+@pytest.mark.parametrize('url', [
+    'https://evil.example/login',
+    'HTTPS://EVIL.EXAMPLE/login',
+    'http://evil.example/login/',
+    'https://evil.example',
+    'https://other.example/paypal/verify?x=1',
+    'https://fine.example/',
+    'https://sub.evil.example/login',
+])
+def test_feed_matches_same_on_table_and_set(tmp_path, url):
+    feed = DbComparator.parse_feed(
+        'https://evil.example/login\nhttp://other.example/paypal/verify\nhttps://ação.example/x\n'
+    )
+    table = SharedTable(str(tmp_path / 'openphish.sst'))
+    table.replace(feed)
+    assert DbComparator.feed_matches(url, table) == DbComparator.feed_matches(url, feed)
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.rollups import HISTORY_COLUMNS, MAX_WINDOW, StatsRollups, host_and_tld, parse_window
+
+OK = {'url_status': 'OK', 'webpage_status': 'OK', 'db_status': 'OK', 'technical_status': 'OK', 'content_status': 'OK'}
+
+
+def _statuses(**fails):
+    statuses = dict(OK)
+    statuses.update({f'{name}_status': 'FAIL' for name in fails})
+    return statuses
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    return StatsRollups(str(tmp_path / 'rollups.sqlite3'))
+
+
+@pytest.mark.parametrize('window, delta, granularity', [
+    ('15m', timedelta(minutes=15), 'minute'),
+    ('120m', timedelta(hours=2), 'minute'),
+    ('2h', timedelta(hours=2), 'minute'),
+    ('121m', timedelta(minutes=121), 'hour'),
+    ('24h', timedelta(hours=24), 'hour'),
+    ('3d', timedelta(days=3), 'hour'),
+    ('73h', timedelta(hours=73), 'day'),
+    ('7d', timedelta(days=7), 'day'),
+    (f'{MAX_WINDOW.days}d', MAX_WINDOW, 'day'),
+])
+def test_parse_window(window, delta, granularity):
+    assert parse_window(window) == (delta, granularity)
+
+
+@pytest.mark.parametrize('window', [
+    None, '', '0m', '15', '15s', '1w', '-5m', 'abc', ' 15m',
+    f'{MAX_WINDOW.days + 1}d', '1000000000d', '99999999999d', '99999999999999999999m',
+])
+def test_parse_window_rejects_invalid(window):
+    with pytest.raises(ValueError):
+        parse_window(window)
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.Example.com/login', ('example.com', 'com')),
+    ('http://sub.banco.com.br', ('sub.banco.com.br', 'br')),
+    ('http://192.168.0.1/admin', ('192.168.0.1', 'ip')),
+    ('https://[2001:db8::1]/', ('2001:db8::1', 'ip')),
+    ('https://', ('', '')),
+])
+def test_host_and_tld(url, expected):
+    assert host_and_tld(url) == expected
+
+
+def test_record_and_query_totals(rollups):
+    now = datetime(2026, 10, 19, 12, 0, 30)
+    rollups.record(now, 'https://a.com/x', _statuses(url=True, db=True))
+    rollups.record(now, 'https://b.com', OK)
+    totals = rollups.query('15m', now=now)
+    assert totals['total'] == 2
+    assert totals['url_fail'] == 1 and totals['db_fail'] == 1 and totals['content_fail'] == 0
+    assert rollups.query(now=now) == totals
+
+
+def test_window_bucket_edges(rollups):
+    now = datetime(2026, 10, 19, 12, 0, 30)
+    # Minuto: o bucket de 11:45 entra na janela de 15m a partir de 12:00:30, o de 11:44 não
+    rollups.record(datetime(2026, 10, 19, 11, 45, 59), 'https://a.com', OK)
+    rollups.record(datetime(2026, 10, 19, 11, 44, 59), 'https://a.com', OK)
+    assert rollups.query('15m', now=now)['total'] == 1
+    # 10:59:59 fica fora da janela de 60m (buckets a partir de 11:00) e dentro da de 61m
+    rollups.record(datetime(2026, 10, 19, 10, 59, 59), 'https://a.com', OK)
+    assert rollups.query('60m', now=now)['total'] == 2
+    assert rollups.query('61m', now=now)['total'] == 3
+    # Hora: a janela de 3h começa no bucket das 09h
+    rollups.record(datetime(2026, 10, 19, 8, 59, 59), 'https://a.com', OK)
+    rollups.record(datetime(2026, 10, 19, 9, 0, 0), 'https://a.com', OK)
+    assert rollups.query('3h', now=now)['total'] == 4
+    # Dia: meia-noite abre um bucket novo
+    rollups.record(datetime(2026, 10, 14, 23, 59, 59), 'https://a.com', OK)
+    rollups.record(datetime(2026, 10, 15, 0, 0, 0), 'https://a.com', OK)
+    assert rollups.query('4d', now=now)['total'] == 6
+
+
+def test_group_by_host_and_tld(rollups):
+    now = datetime(2026, 10, 19, 12, 0)
+    for url in ['https://a.com', 'https://www.a.com/x', 'https://b.com.br', 'http://10.0.0.1']:
+        rollups.record(now, url, _statuses(url=True))
+    hosts = rollups.query('1h', 'host', now=now)
+    assert hosts['a.com']['total'] == 2
+    assert list(hosts)[0] == 'a.com'
+    assert rollups.query('1h', 'tld', now=now) == {
+        'com': dict(hosts['a.com']),
+        'br': dict(hosts['b.com.br']),
+        'ip': dict(hosts['10.0.0.1']),
+    }
+    assert len(rollups.query('1h', 'host', limit=1, now=now)) == 1
+
+
+def test_query_rejects_invalid_group_by(rollups):
+    with pytest.raises(ValueError):
+        rollups.query('1h', 'url')
+
+
+def test_retention_drops_old_minutes_but_keeps_days(rollups):
+    old = datetime(2026, 10, 1, 12, 0)
+    rollups.record(old, 'https://a.com', OK)
+    rollups._last_prune = 0
+    rollups.record(datetime(2026, 10, 19, 12, 0), 'https://b.com', OK)
+    # Só o bucket de minuto da análise recente sobrou (a consulta não tem limite superior)
+    assert rollups.query('120m', now=old + timedelta(minutes=1))['total'] == 1
+    assert rollups.query('30d', now=datetime(2026, 10, 19, 12, 0))['total'] == 2
+
+
+def _write_history(path, rows, header=True):
+    lines = [','.join(HISTORY_COLUMNS)] if header else []
+    lines += [','.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+@pytest.mark.parametrize('header', [True, False])
+def test_backfill_rebuilds_and_marks_completion(rollups, tmp_path, header):
+    hist = tmp_path / 'history.csv'
+    _write_history(hist, [
+        ['2026-10-19T10:00:00', 'https://a.com', 'FAIL', 'OK', 'OK', 'OK', 'OK'],
+        ['2026-10-19T10:01:00', 'https://b.com', 'OK', 'OK', 'OK', 'SKIPPED', 'OK'],
+        ['linha-invalida', 'https://c.com', 'OK', 'OK', 'OK', 'OK', 'OK'],
+    ], header=header)
+    assert not rollups.backfilled()
+    # Contagens anteriores são descartadas pelo backfill
+    rollups.record(datetime(2026, 10, 19, 9, 0), 'https://old.com', OK)
+    assert rollups.backfill(str(hist)) == 2
+    assert rollups.backfilled()
+    totals = rollups.query()
+    assert totals['total'] == 2 and totals['url_fail'] == 1 and totals['technical_fail'] == 0
+
+
+def test_interrupted_backfill_is_not_marked(rollups, tmp_path, monkeypatch):
+    hist = tmp_path / 'history.csv'
+    _write_history(hist, [['2026-10-19T10:00:00', 'https://a.com'] + ['OK'] * 5] * 3)
+    calls = []
+    upsert = rollups._upsert
+
+    def failing(conn, rows):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('processo interrompido')
+        upsert(conn, rows)
+
+    monkeypatch.setattr(rollups, '_upsert', failing)
+    with pytest.raises(RuntimeError):
+        rollups.backfill(str(hist))
+    assert not rollups.backfilled()
+    assert rollups.query()['total'] == 0